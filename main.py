@@ -1,5 +1,14 @@
-import requests
+import aiosqlite
+import asyncio
+import httpx
+import orjson
+from urllib.parse import quote
+from limits import parse as parse_rate
+from limits.aio.storage import MemoryStorage
+from limits.aio.strategies import MovingWindowRateLimiter
+from tenacity import retry, retry_if_exception, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.error import BadRequest, RetryAfter, TimedOut
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -7,11 +16,26 @@ from telegram.ext import (
     filters,
     ContextTypes,
     CallbackQueryHandler,
-    ConversationHandler
+    ConversationHandler,
+    ApplicationHandlerStop,
+    BaseUpdateProcessor
 )
 import logging
-from io import BytesIO
-from datetime import datetime
+import os
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+from datetime import timedelta
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+try:
+    import uvloop
+except ImportError:  # uvloop не поддерживает Windows
+    uvloop = None
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -20,6 +44,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+BOT_TOKEN = os.environ["BOT_TOKEN"]
+
 SEARCH, COMPARE_FIRST, COMPARE_SECOND = range(3)
 
 MOLECULE_EXAMPLES = {
@@ -38,55 +64,290 @@ MOLECULE_EXAMPLES = {
     ]
 }
 
-SEARCH_HISTORY = {}
-FAVORITES = {}
-
-def create_main_menu():
-    """Создает клавиатуру главного меню"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔍 Поиск молекулы", callback_data='search')],
-        [InlineKeyboardButton("🎲 Случайная молекула", callback_data='random')],
-        [InlineKeyboardButton("⚖️ Сравнить молекулы", callback_data='compare')],
-        [InlineKeyboardButton("📚 Примеры молекул", callback_data='examples')],
-        [InlineKeyboardButton("📋 История поиска", callback_data='history'),
-         InlineKeyboardButton("⭐ Избранное", callback_data='favorites')],
-        [InlineKeyboardButton("ℹ️ Помощь", callback_data='help')]
-    ])
+# История поиска и избранное хранятся в SQLite и переживают перезапуск бота
+DB_PATH = os.environ.get('BOT_DB', 'bot.db')
+DB = None
+HISTORY_LIMIT = 50  # Сколько последних запросов хранить для каждого пользователя
+
+async def open_db(application: Application):
+    """Открывает базу данных и создает таблицы"""
+    global DB
+    DB = await aiosqlite.connect(DB_PATH)
+    await DB.executescript("""
+        CREATE TABLE IF NOT EXISTS history (
+            user_id INTEGER NOT NULL,
+            cid TEXT NOT NULL,
+            name TEXT NOT NULL,
+            ts REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_user_ts ON history (user_id, ts);
+        CREATE TABLE IF NOT EXISTS favorites (
+            user_id INTEGER NOT NULL,
+            cid TEXT NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (user_id, cid)
+        );
+    """)
+    await DB.commit()
+
+async def add_history(user_id, cid, name, ts):
+    """Добавляет запрос в историю и удаляет самые старые записи сверх лимита"""
+    await DB.execute(
+        "INSERT INTO history (user_id, cid, name, ts) VALUES (?, ?, ?, ?)",
+        (user_id, str(cid), name, ts)
+    )
+    await DB.execute(
+        "DELETE FROM history WHERE user_id = ? AND rowid NOT IN "
+        "(SELECT rowid FROM history WHERE user_id = ? ORDER BY ts DESC LIMIT ?)",
+        (user_id, user_id, HISTORY_LIMIT)
+    )
+    await DB.commit()
+
+async def get_history(user_id, limit=5):
+    """Возвращает последние запросы пользователя, начиная с новых"""
+    async with DB.execute(
+        "SELECT cid, name FROM history WHERE user_id = ? ORDER BY ts DESC LIMIT ?",
+        (user_id, limit)
+    ) as cursor:
+        return await cursor.fetchall()
+
+async def add_favorite(user_id, cid, name):
+    """Сохраняет молекулу в избранное"""
+    await DB.execute(
+        "INSERT OR REPLACE INTO favorites (user_id, cid, name) VALUES (?, ?, ?)",
+        (user_id, str(cid), name)
+    )
+    await DB.commit()
+
+async def get_favorites(user_id):
+    """Возвращает избранные молекулы пользователя"""
+    async with DB.execute(
+        "SELECT cid, name FROM favorites WHERE user_id = ? ORDER BY rowid",
+        (user_id,)
+    ) as cursor:
+        return await cursor.fetchall()
+
+async def remove_favorite(user_id, cid):
+    """Удаляет молекулу из избранного и возвращает её название"""
+    async with DB.execute(
+        "SELECT name FROM favorites WHERE user_id = ? AND cid = ?",
+        (user_id, cid)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    await DB.execute(
+        "DELETE FROM favorites WHERE user_id = ? AND cid = ?",
+        (user_id, cid)
+    )
+    await DB.commit()
+    return row[0]
+
+# Кэш результатов поиска, вытеснение LRU:
+# (название, False) -> {'CID': ...}, (CID, True) -> данные молекулы
+COMPOUND_CACHE = OrderedDict()
+COMPOUND_CACHE_SIZE = 1024
+
+# Загрузки, которые ещё выполняются: (запрос, by_cid) -> задача
+PENDING_FETCHES = {}
+
+# Общий кэш в Redis (если задан REDIS_URL): переживает перезапуск
+# и разделяется между несколькими процессами бота
+REDIS_URL = os.environ.get('REDIS_URL')
+REDIS = aioredis.Redis.from_url(REDIS_URL) if REDIS_URL and aioredis else None
+JSON_TTL = 24 * 60 * 60
+
+def redis_key(query, by_cid):
+    """Возвращает ключ Redis для данных молекулы"""
+    return f"pc:json:{'cid' if by_cid else 'name'}:{query}"
+
+async def load_cached_compound(query, by_cid):
+    """Достает молекулу из Redis"""
+    if REDIS is None:
+        return None
+    try:
+        cached = await REDIS.get(redis_key(query, by_cid))
+        return orjson.loads(cached) if cached is not None else None
+    except Exception as e:
+        logger.warning(f"Redis read error: {e}")
+        return None
+
+async def store_cached_compound(query, by_cid, result):
+    """Сохраняет молекулу в Redis"""
+    if REDIS is None:
+        return
+    try:
+        await REDIS.set(redis_key(query, by_cid), orjson.dumps(result), ex=JSON_TTL)
+    except Exception as e:
+        logger.warning(f"Redis write error: {e}")
+
+# Telegram file_id уже загруженных изображений: CID -> file_id, вытеснение LRU
+FILE_ID_CACHE = OrderedDict()
+FILE_ID_CACHE_SIZE = 1024
+
+def remember_file_id(cid, file_id):
+    """Кладёт file_id в локальный кэш, вытесняя самые давние записи"""
+    FILE_ID_CACHE[cid] = file_id
+    FILE_ID_CACHE.move_to_end(cid)
+    if len(FILE_ID_CACHE) > FILE_ID_CACHE_SIZE:
+        FILE_ID_CACHE.popitem(last=False)
+
+async def get_file_id(cid):
+    """Возвращает file_id изображения молекулы, если Telegram его уже получал"""
+    cid = str(cid)
+    file_id = FILE_ID_CACHE.get(cid)
+    if file_id is not None:
+        FILE_ID_CACHE.move_to_end(cid)
+    elif REDIS is not None:
+        try:
+            cached = await REDIS.get(f"pc:fileid:{cid}")
+        except Exception as e:
+            logger.warning(f"Redis read error: {e}")
+            cached = None
+        if cached is not None:
+            file_id = cached.decode()
+            remember_file_id(cid, file_id)
+    return file_id
+
+async def store_file_id(cid, file_id):
+    """Запоминает file_id изображения молекулы"""
+    cid = str(cid)
+    remember_file_id(cid, file_id)
+    if REDIS is not None:
+        try:
+            await REDIS.set(f"pc:fileid:{cid}", file_id)
+        except Exception as e:
+            logger.warning(f"Redis write error: {e}")
+
+async def forget_file_id(cid):
+    """Удаляет file_id, который Telegram больше не принимает"""
+    cid = str(cid)
+    FILE_ID_CACHE.pop(cid, None)
+    if REDIS is not None:
+        try:
+            await REDIS.delete(f"pc:fileid:{cid}")
+        except Exception as e:
+            logger.warning(f"Redis write error: {e}")
+
+# Клавиатуры не меняются во время работы бота, поэтому создаются один раз
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔍 Поиск молекулы", callback_data='search')],
+    [InlineKeyboardButton("🎲 Случайная молекула", callback_data='random')],
+    [InlineKeyboardButton("⚖️ Сравнить молекулы", callback_data='compare')],
+    [InlineKeyboardButton("📚 Примеры молекул", callback_data='examples')],
+    [InlineKeyboardButton("📋 История поиска", callback_data='history'),
+     InlineKeyboardButton("⭐ Избранное", callback_data='favorites')],
+    [InlineKeyboardButton("ℹ️ Помощь", callback_data='help')]
+])
+BACK_BUTTON = InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')
+BACK_MARKUP = InlineKeyboardMarkup([[BACK_BUTTON]])
+EXAMPLES_BACK_BUTTON = InlineKeyboardButton("↩️ Назад", callback_data='examples')
+EXAMPLES_BACK_MARKUP = InlineKeyboardMarkup([[EXAMPLES_BACK_BUTTON]])
+EXAMPLES_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(category, callback_data=f"category_{category}")]
+     for category in MOLECULE_EXAMPLES]
+    + [[BACK_BUTTON]]
+)
+CATEGORY_KEYBOARDS = {
+    category: InlineKeyboardMarkup(
+        [[InlineKeyboardButton(name, callback_data=f"search_{term}")]
+         for name, term in examples]
+        + [[EXAMPLES_BACK_BUTTON]]
+    )
+    for category, examples in MOLECULE_EXAMPLES.items()
+}
 
 class PubChemClient:
     BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+    # Запрашиваем только нужные свойства вместо полной записи соединения
+    PROPERTIES = "MolecularFormula,MolecularWeight,IUPACName,CanonicalSMILES,InChIKey"
     
     @classmethod
-    def search_compound(cls, query, by_cid=False):
+    async def search_by_name(cls, name):
+        name = name.strip()
+        # Кэшируется только CID найденной молекулы, сама запись — под ключом CID,
+        # поэтому кнопки, работающие по CID, попадают в тот же кэш
+        found = await cls._cached(name, False, lambda: cls._fetch_cid(name))
+        if not found:
+            return None
+        result = await cls.search_by_cid(found['CID'])
+        if not result:
+            return None
+        # Название показываем таким, каким его ввёл пользователь
+        return {**result, 'Name': name}
+    
+    @classmethod
+    async def search_by_cid(cls, cid):
+        cid = str(cid).strip()
+        return await cls._cached(cid, True, lambda: cls._fetch_record(cid))
+    
+    @classmethod
+    async def _cached(cls, query, by_cid, fetch):
+        key = (query.lower(), by_cid)
+        cached = COMPOUND_CACHE.get(key)
+        if cached is not None:
+            COMPOUND_CACHE.move_to_end(key)
+            return dict(cached)
+        
+        # Если эту молекулу уже загружают (например, предзагрузка), ждём тот же запрос
+        pending = PENDING_FETCHES.get(key)
+        if pending is None:
+            pending = asyncio.create_task(cls._load(key, fetch))
+            PENDING_FETCHES[key] = pending
+            pending.add_done_callback(lambda _: PENDING_FETCHES.pop(key, None))
+        result = await asyncio.shield(pending)
+        return dict(result) if result else result
+    
+    @classmethod
+    async def _load(cls, key, fetch):
+        result = await load_cached_compound(*key)
+        if result is None:
+            result = await fetch()
+            if result:
+                await store_cached_compound(*key, result)
+        if result:
+            COMPOUND_CACHE[key] = dict(result)
+            if len(COMPOUND_CACHE) > COMPOUND_CACHE_SIZE:
+                COMPOUND_CACHE.popitem(last=False)
+        return result
+    
+    @classmethod
+    async def _fetch_cid(cls, name):
         try:
-            if by_cid:
-                cid = query
-            else:
-                search_url = f"{cls.BASE_URL}/compound/name/{query}/cids/JSON"
-                response = requests.get(search_url, timeout=10)
-                if response.status_code != 200:
-                    return None
-                cid = response.json()['IdentifierList']['CID'][0]
-            
-            record_url = f"{cls.BASE_URL}/compound/cid/{cid}/JSON"
-            response = requests.get(record_url, timeout=10)
+            response = await pubchem_get(f"/compound/name/{quote(name, safe='')}/cids/JSON")
             if response.status_code != 200:
                 return None
-                
-            data = response.json()
-            compound = data['PC_Compounds'][0]
+            cid = orjson.loads(response.content)['IdentifierList']['CID'][0]
+        except Exception as e:
+            logger.error(f"PubChem API error: {e}")
+            return None
+        return {'CID': cid}
+    
+    @classmethod
+    async def _fetch_record(cls, cid):
+        try:
+            response = await pubchem_get(f"/compound/cid/{cid}/property/{cls.PROPERTIES}/JSON")
+            if response.status_code != 200:
+                return None
+            
+            props = orjson.loads(response.content)['PropertyTable']['Properties'][0]
             
-            props = {p['urn']['label']: p['value']['sval'] 
-                    for p in compound.get('props', []) 
-                    if 'urn' in p and 'label' in p['urn'] and 'sval' in p['value']}
+            weight = props.get('MolecularWeight', 'N/A')
+            try:
+                weight_num = float(weight)
+            except (TypeError, ValueError):
+                weight_num = None
             
             return {
                 'CID': cid,
-                'Name': query if not by_cid else props.get('IUPAC Name', f"CID {cid}"),
-                'MolecularFormula': compound.get('atoms', {}).get('fstring', 'N/A'),
-                'MolecularWeight': compound.get('coords', [{}])[0].get('weight', {}).get('value', 'N/A'),
-                'IUPACName': props.get('IUPAC Name', 'N/A'),
-                'CanonicalSMILES': props.get('SMILES', 'N/A'),
+                'Name': props.get('IUPACName', f"CID {cid}"),
+                'MolecularFormula': props.get('MolecularFormula', 'N/A'),
+                'MolecularWeight': weight,
+                'MolecularWeightNum': weight_num,
+                'IUPACName': props.get('IUPACName', 'N/A'),
+                # PubChem отдаёт CanonicalSMILES под именем ConnectivitySMILES
+                'CanonicalSMILES': (props.get('CanonicalSMILES') or props.get('ConnectivitySMILES')
+                                    or props.get('SMILES') or 'N/A'),
                 'InChIKey': props.get('InChIKey', 'N/A'),
                 'image_url': f"{cls.BASE_URL}/compound/cid/{cid}/PNG",
                 'pubchem_url': f"https://pubchem.ncbi.nlm.nih.gov/compound/{cid}"
@@ -96,40 +357,157 @@ class PubChemClient:
             return None
     
     @classmethod
-    def get_random_compound(cls):
+    async def get_random_compound(cls):
         try:
-            response = requests.get(
-                f"{cls.BASE_URL}/compound/random/random.cid/JSON",
-                timeout=10
-            )
+            response = await pubchem_get("/compound/random/random.cid/JSON")
             if response.status_code == 200:
-                cid = response.json()['IdentifierList']['CID'][0]
-                return cls.search_compound(cid, by_cid=True)
+                cid = orjson.loads(response.content)['IdentifierList']['CID'][0]
+                return await cls.search_by_cid(cid)
         except Exception as e:
             logger.error(f"Error getting random compound: {e}")
         return None
     
     @classmethod
-    def get_similar_compounds(cls, cid, limit=5):
+    async def get_similar_compounds(cls, cid, limit=5):
         try:
-            url = f"{cls.BASE_URL}/compound/fastsimilarity_2d/cid/{cid}/cids/JSON?Threshold=90&MaxRecords={limit}"
-            response = requests.get(url, timeout=10)
+            response = await pubchem_get(
+                f"/compound/fastsimilarity_2d/cid/{cid}/cids/JSON",
+                params={'Threshold': 90, 'MaxRecords': limit}
+            )
             if response.status_code == 200:
-                return response.json()['IdentifierList']['CID']
+                return orjson.loads(response.content)['IdentifierList']['CID']
         except Exception as e:
             logger.error(f"Error getting similar compounds: {e}")
         return []
 
+class RateLimiter:
+    """Ограничивает частоту исходящих запросов по скользящему окну"""
+    
+    def __init__(self, rate):
+        self.item = parse_rate(rate)
+        self.limiter = MovingWindowRateLimiter(MemoryStorage())
+        # asyncio.Lock пропускает ожидающих по очереди, поэтому запросы
+        # обслуживаются в порядке поступления
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self.lock:
+            while not await self.limiter.hit(self.item):
+                stats = await self.limiter.get_window_stats(self.item)
+                await asyncio.sleep(max(stats.reset_time - time.time(), 0.01))
+    
+    async def has_capacity(self, reserve=0):
+        """Проверяет, что никто не ждёт своей очереди и свободно больше reserve слотов"""
+        if self.lock.locked():
+            return False
+        stats = await self.limiter.get_window_stats(self.item)
+        return stats.remaining > reserve
+
+# PubChem допускает не более 5 запросов в секунду — лимит общий для всех обработчиков
+PUBCHEM_LIMITER = RateLimiter("5/second")
+
+# Одна попытка и до трёх повторов для запросов к PubChem и Telegram
+MAX_ATTEMPTS = 4
+MAX_WAIT = 30  # Не ждём дольше, даже если сервер просит больше
+BACKOFF = wait_exponential_jitter(initial=1, max=MAX_WAIT)
+
+# Общий клиент: соединения с PubChem переиспользуются между запросами,
+# поэтому TLS-рукопожатие оплачивается только при первом обращении
+PUBCHEM = httpx.AsyncClient(
+    base_url=PubChemClient.BASE_URL,
+    timeout=10.0,
+    limits=httpx.Limits(
+        max_connections=50,
+        max_keepalive_connections=50,
+        keepalive_expiry=60.0
+    ),
+    http2=True
+)
+
+def retry_after_or_backoff(retry_state):
+    """Ждёт столько, сколько просит сервер (429), иначе — экспоненциально со случайным разбросом"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, RetryAfter):
+        return min(to_seconds(error.retry_after), MAX_WAIT)
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_WAIT)
+            except ValueError:
+                pass
+    return BACKOFF(retry_state)
+
+def to_seconds(value):
+    """Приводит retry_after из Telegram (число или timedelta) к секундам"""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+def is_retryable_http_error(error):
+    """Сетевые ошибки, 429 и 5xx от PubChem стоит повторить"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+@retry(
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    wait=retry_after_or_backoff,
+    retry=retry_if_exception(is_retryable_http_error),
+    reraise=True
+)
+async def pubchem_get(url, **kwargs):
+    """GET-запрос к PubChem с повторами при временных сбоях"""
+    await PUBCHEM_LIMITER.acquire()
+    response = await PUBCHEM.get(url, **kwargs)
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+telegram_retry = retry(
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    wait=retry_after_or_backoff,
+    # Повторяем только флуд-контроль: после сетевого сбоя сообщение могло уже уйти
+    retry=retry_if_exception_type(RetryAfter),
+    reraise=True
+)
+
+@telegram_retry
+async def edit_message(callback_query, **kwargs):
+    await callback_query.edit_message_text(**kwargs)
+
+@telegram_retry
+async def reply_message(message, **kwargs):
+    await message.reply_text(**kwargs)
+
 async def safe_edit_or_reply(callback_query, text, reply_markup=None, parse_mode=None):
     try:
-        await callback_query.edit_message_text(
+        await edit_message(
+            callback_query,
             text=text,
             reply_markup=reply_markup,
             parse_mode=parse_mode
         )
+    except BadRequest as e:
+        if 'message is not modified' in str(e).lower():
+            return
+        logger.warning(f"Couldn't edit message, sending new: {e}")
+        await reply_message(
+            callback_query.message,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    except TimedOut as e:
+        # Сообщение могло уже измениться, поэтому новое не отправляем
+        logger.warning(f"Timed out editing message: {e}")
     except Exception as e:
         logger.warning(f"Couldn't edit message, sending new: {e}")
-        await callback_query.message.reply_text(
+        await reply_message(
+            callback_query.message,
             text=text,
             reply_markup=reply_markup,
             parse_mode=parse_mode
@@ -141,13 +519,13 @@ async def show_main_menu(update: Update, text: str = "👨‍🔬 *Химиче
         await safe_edit_or_reply(
             update.callback_query,
             text,
-            reply_markup=create_main_menu(),
+            reply_markup=MAIN_MENU_MARKUP,
             parse_mode='Markdown'
         )
     else:
         await update.message.reply_text(
             text,
-            reply_markup=create_main_menu(),
+            reply_markup=MAIN_MENU_MARKUP,
             parse_mode='Markdown'
         )
 
@@ -170,7 +548,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await safe_edit_or_reply(
         update.callback_query,
         help_text,
-        reply_markup=create_main_menu(),
+        reply_markup=MAIN_MENU_MARKUP,
         parse_mode='Markdown'
     )
 
@@ -179,9 +557,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await safe_edit_or_reply(
         update.callback_query,
         "🔍 Введите название молекулы или её CID:",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')]
-        ])
+        reply_markup=BACK_MARKUP
     )
     return SEARCH
 
@@ -192,7 +568,7 @@ async def handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
 async def random_molecule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает случайную молекулу"""
-    result = PubChemClient.get_random_compound()
+    result = await PubChemClient.get_random_compound()
     if result:
         await send_molecule_info(update.callback_query.message, result)
     else:
@@ -203,45 +579,37 @@ async def compare_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await safe_edit_or_reply(
         update.callback_query,
         "⚖️ Введите название или CID первой молекулы:",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')]
-        ])
+        reply_markup=BACK_MARKUP
     )
     return COMPARE_FIRST
 
 async def compare_first(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает первую молекулу для сравнения"""
-    result = PubChemClient.search_compound(update.message.text)
+    result = await PubChemClient.search_by_name(update.message.text)
     if result:
         context.user_data['compare_first'] = result
         await update.message.reply_text(
             "Теперь введите вторую молекулу:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')]
-            ])
+            reply_markup=BACK_MARKUP
         )
         return COMPARE_SECOND
     else:
         await update.message.reply_text(
             "Молекула не найдена. Попробуйте снова:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')]
-            ])
+            reply_markup=BACK_MARKUP
         )
         return COMPARE_FIRST
 
 async def compare_second(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает вторую молекулу и показывает сравнение"""
-    second = PubChemClient.search_compound(update.message.text)
+    second = await PubChemClient.search_by_name(update.message.text)
     if second:
         first = context.user_data['compare_first']
         await send_comparison(update.message, first, second)
     else:
         await update.message.reply_text(
             "Молекула не найдена. Попробуйте снова:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')]
-            ])
+            reply_markup=BACK_MARKUP
         )
         return COMPARE_SECOND
     return ConversationHandler.END
@@ -249,8 +617,8 @@ async def compare_second(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def send_comparison(message, first, second):
     """Отправляет результат сравнения"""
     try:
-        mw1 = float(first['MolecularWeight']) if first['MolecularWeight'] != 'N/A' else 0
-        mw2 = float(second['MolecularWeight']) if second['MolecularWeight'] != 'N/A' else 0
+        mw1 = first.get('MolecularWeightNum') or 0
+        mw2 = second.get('MolecularWeightNum') or 0
         mass_diff = abs(mw1 - mw2)
         
         text = (
@@ -266,31 +634,31 @@ async def send_comparison(message, first, second):
         
         await message.reply_text(
             text,
-            reply_markup=create_main_menu(),
+            reply_markup=MAIN_MENU_MARKUP,
             parse_mode='Markdown'
         )
     except Exception as e:
         logger.error(f"Comparison error: {e}")
         await message.reply_text(
             "Ошибка при сравнении.",
-            reply_markup=create_main_menu()
+            reply_markup=MAIN_MENU_MARKUP
         )
 
 async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает историю поиска"""
     user_id = update.callback_query.from_user.id
-    if user_id not in SEARCH_HISTORY or not SEARCH_HISTORY[user_id]:
+    history = await get_history(user_id)  # Последние 5 запросов
+    if not history:
         await show_main_menu(update, "История поиска пуста.")
         return
     
-    history = SEARCH_HISTORY[user_id][-5:]  # Последние 5 запросов
     keyboard = [
         [InlineKeyboardButton(
-            f"{item['name']}", 
-            callback_data=f"history_{item['cid']}")]
-        for item in reversed(history)
+            f"{name}", 
+            callback_data=f"history_{cid}")]
+        for cid, name in history
     ]
-    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')])
+    keyboard.append([BACK_BUTTON])
     
     await safe_edit_or_reply(
         update.callback_query,
@@ -301,16 +669,17 @@ async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает избранные молекулы"""
     user_id = update.callback_query.from_user.id
-    if user_id not in FAVORITES or not FAVORITES[user_id]:
+    favorites = await get_favorites(user_id)
+    if not favorites:
         await show_main_menu(update, "У вас нет сохранённых молекул.")
         return
     
     keyboard = [
         [InlineKeyboardButton(name, callback_data=f"history_{cid}"),
          InlineKeyboardButton("❌", callback_data=f"remove_{cid}")]
-        for cid, name in FAVORITES[user_id].items()
+        for cid, name in favorites
     ]
-    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')])
+    keyboard.append([BACK_BUTTON])
     
     await safe_edit_or_reply(
         update.callback_query,
@@ -320,96 +689,99 @@ async def show_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_examples(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает категории примеров"""
-    keyboard = [
-        [InlineKeyboardButton(category, callback_data=f"category_{category}")]
-        for category in MOLECULE_EXAMPLES.keys()
-    ]
-    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data='back_to_menu')])
-    
     await safe_edit_or_reply(
         update.callback_query,
         "📚 Примеры молекул:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=EXAMPLES_KEYBOARD
     )
 
 async def show_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает молекулы в выбранной категории"""
     category = update.callback_query.data.replace("category_", "")
-    examples = MOLECULE_EXAMPLES.get(category, [])
-    
-    keyboard = [
-        [InlineKeyboardButton(name, callback_data=f"search_{term}")]
-        for name, term in examples
-    ]
-    keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data='examples')])
     
     await safe_edit_or_reply(
         update.callback_query,
         f"🔬 {category}:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=CATEGORY_KEYBOARDS.get(category, EXAMPLES_BACK_MARKUP)
     )
 
-async def process_chemical_search(message, query, by_cid=False):
-    """Обрабатывает поиск химического соединения"""
-    result = PubChemClient.search_compound(query, by_cid)
+async def process_chemical_search(message, query):
+    """Обрабатывает поиск химического соединения по названию"""
+    result = await PubChemClient.search_by_name(query)
+    await reply_with_search_result(message, query, result)
+
+async def process_cid_search(message, cid):
+    """Обрабатывает поиск химического соединения по CID"""
+    result = await PubChemClient.search_by_cid(cid)
+    await reply_with_search_result(message, cid, result)
+
+async def reply_with_search_result(message, query, result):
+    """Сохраняет найденную молекулу в историю и отправляет её пользователю"""
     if not result:
         await message.reply_text(
             f"Не удалось найти молекулу '{query}'.",
-            reply_markup=create_main_menu()
+            reply_markup=MAIN_MENU_MARKUP
         )
         return
     
     # Сохраняем в историю
     user_id = message.from_user.id
-    if user_id not in SEARCH_HISTORY:
-        SEARCH_HISTORY[user_id] = []
-    
-    SEARCH_HISTORY[user_id].append({
-        'name': result['Name'],
-        'cid': result['CID'],
-        'time': datetime.now().timestamp()
-    })
+    await add_history(user_id, result['CID'], result['Name'], time.time())
     
     await send_molecule_info(message, result)
 
 async def send_molecule_info(message, data):
     """Отправляет информацию о молекуле"""
-    try:
-        response = requests.get(data['image_url'], timeout=10)
-        if response.status_code == 200:
-            photo = BytesIO(response.content)
-            photo.name = 'molecule.png'
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("📊 PubChem", url=data['pubchem_url']),
-                    InlineKeyboardButton("🧪 Похожие", callback_data=f"similar_{data['CID']}")
-                ],
-                [
-                    InlineKeyboardButton("💾 Сохранить", callback_data=f"save_{data['CID']}"),
-                    InlineKeyboardButton("↩️ Меню", callback_data='back_to_menu')
-                ]
-            ]
-            
+    keyboard = [
+        [
+            InlineKeyboardButton("📊 PubChem", url=data['pubchem_url']),
+            InlineKeyboardButton("🧪 Похожие", callback_data=f"similar_{data['CID']}")
+        ],
+        [
+            InlineKeyboardButton("💾 Сохранить", callback_data=f"save_{data['CID']}"),
+            InlineKeyboardButton("↩️ Меню", callback_data='back_to_menu')
+        ]
+    ]
+    
+    file_id = await get_file_id(data['CID'])
+    if file_id is not None:
+        try:
             await message.reply_photo(
-                photo=photo,
+                photo=file_id,
                 caption=format_molecule_info(data),
                 reply_markup=InlineKeyboardMarkup(keyboard),
                 parse_mode='Markdown'
             )
-        else:
-            await message.reply_text(
-                format_molecule_info(data),
-                reply_markup=create_main_menu(),
-                parse_mode='Markdown'
-            )
-    except Exception as e:
-        logger.error(f"Error sending molecule info: {e}")
-        await message.reply_text(
-            format_molecule_info(data),
-            reply_markup=create_main_menu(),
+            return
+        except BadRequest as e:
+            # Telegram не принял file_id — отправляем изображение заново по ссылке
+            logger.warning(f"Cached file_id rejected, sending by URL: {e}")
+            await forget_file_id(data['CID'])
+        except Exception as e:
+            # Фото могло дойти, поэтому ничего больше не отправляем
+            logger.error(f"Error sending cached photo, it may have been delivered: {e}")
+            return
+    
+    try:
+        # Telegram сам скачивает изображение по ссылке и кэширует его
+        sent = await message.reply_photo(
+            photo=data['image_url'],
+            caption=format_molecule_info(data),
+            reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
+        await store_file_id(data['CID'], sent.photo[-1].file_id)
+    except Exception as e:
+        logger.error(f"Error sending molecule info: {e}")
+        await send_molecule_text(message, data)
+
+async def send_molecule_text(message, data):
+    """Отправляет информацию о молекуле без изображения"""
+    await message.reply_text(
+        format_molecule_info(data),
+        reply_markup=MAIN_MENU_MARKUP,
+        parse_mode='Markdown'
+    )
 
 def format_molecule_info(data):
     """Форматирует информацию о молекуле"""
@@ -427,99 +799,258 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает текстовые сообщения"""
     await process_chemical_search(update.message, update.message.text)
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обрабатывает нажатия на кнопки"""
+def answer_first(callback):
+    """Подтверждает нажатие кнопки перед вызовом обработчика"""
+    @wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.answer()
+        return await callback(update, context)
+    return wrapper
+
+async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Возвращает в главное меню"""
+    await show_main_menu(update)
+    return ConversationHandler.END
+
+async def search_example(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ищет молекулу из списка примеров"""
     query = update.callback_query
-    await query.answer()
-    
-    if query.data == 'back_to_menu':
-        await show_main_menu(update)
-    elif query.data == 'search':
-        await search_command(update, context)
-    elif query.data == 'random':
-        await random_molecule(update, context)
-    elif query.data == 'compare':
-        await compare_command(update, context)
-    elif query.data == 'examples':
-        await show_examples(update, context)
-    elif query.data == 'history':
-        await show_history(update, context)
-    elif query.data == 'favorites':
-        await show_favorites(update, context)
-    elif query.data == 'help':
-        await help_command(update, context)
-    elif query.data.startswith('category_'):
-        await show_category(update, context)
-    elif query.data.startswith('search_'):
-        await process_chemical_search(query.message, query.data.replace("search_", ""))
-    elif query.data.startswith('history_'):
-        await process_chemical_search(query.message, query.data.replace("history_", ""), True)
-    elif query.data.startswith('similar_'):
-        cid = query.data.replace("similar_", "")
-        similar = PubChemClient.get_similar_compounds(cid)
-        if similar:
-            keyboard = [
-                [InlineKeyboardButton(f"Молекула {i+1}", callback_data=f"history_{cid}")]
-                for i, cid in enumerate(similar)
-            ]
-            keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data=f"history_{query.data.replace('similar_', '')}")])
-            await safe_edit_or_reply(
-                query,
-                "🧪 Похожие молекулы:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-    elif query.data.startswith('save_'):
-        cid = query.data.replace("save_", "")
-        user_id = query.from_user.id
-        if user_id not in FAVORITES:
-            FAVORITES[user_id] = {}
-        result = PubChemClient.search_compound(cid, True)
-        if result:
-            FAVORITES[user_id][cid] = result['Name']
-            await query.answer(f"Сохранено: {result['Name']}")
-    elif query.data.startswith('remove_'):
-        cid = query.data.replace("remove_", "")
-        user_id = query.from_user.id
-        if user_id in FAVORITES and cid in FAVORITES[user_id]:
-            name = FAVORITES[user_id].pop(cid)
-            await query.answer(f"Удалено: {name}")
-            await show_favorites(update, context)
+    await process_chemical_search(query.message, query.data.replace("search_", ""))
 
-def main():
-    """Запускает бота"""
-    application = Application.builder().token("7606289346:AAF0mbAJpbssJEtocPcXmPELcZqXYbXcVbs").build()
+async def open_history_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Открывает молекулу по CID из истории, избранного или похожих"""
+    query = update.callback_query
+    await process_cid_search(query.message, query.data.replace("history_", ""))
+
+# Фоновые задачи предзагрузки: ссылки не дают сборщику мусора прервать их
+PREFETCH_TASKS = set()
+# Сколько слотов лимита PubChem предзагрузка всегда оставляет свободными
+PREFETCH_RESERVE = 2
+
+async def prefetch_compounds(cids):
+    """Заранее загружает молекулы в кэш, пока пользователь выбирает"""
+    for cid in cids:
+        # Уже закэшированные (обычно это исходная молекула) повторно не загружаем
+        if (str(cid), True) in COMPOUND_CACHE:
+            continue
+        # Предзагрузка уступает лимит PubChem интерактивным запросам:
+        # как только запросов становится больше, она прекращается
+        if not await PUBCHEM_LIMITER.has_capacity(PREFETCH_RESERVE):
+            return
+        await PubChemClient.search_by_cid(cid)
+
+async def show_similar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает похожие молекулы"""
+    query = update.callback_query
+    cid = query.data.replace("similar_", "")
+    similar = await PubChemClient.get_similar_compounds(cid)
+    if similar:
+        task = asyncio.create_task(prefetch_compounds(similar))
+        PREFETCH_TASKS.add(task)
+        task.add_done_callback(PREFETCH_TASKS.discard)
+        
+        keyboard = [
+            [InlineKeyboardButton(f"Молекула {i+1}", callback_data=f"history_{similar_cid}")]
+            for i, similar_cid in enumerate(similar)
+        ]
+        keyboard.append([InlineKeyboardButton("↩️ Назад", callback_data=f"history_{cid}")])
+        await safe_edit_or_reply(
+            query,
+            "🧪 Похожие молекулы:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+# Сколько секунд можно искать молекулу, прежде чем ответить на нажатие кнопки
+ANSWER_TIMEOUT = 10
+
+async def save_to_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сохраняет молекулу в избранное"""
+    query = update.callback_query
+    cid = query.data.replace("save_", "")
+    user_id = query.from_user.id
+    # Ответ на нажатие нужно успеть отправить, пока Telegram его ждёт;
+    # shield не прерывает сам запрос, и его результат всё равно попадёт в кэш
+    try:
+        result = await asyncio.wait_for(
+            asyncio.shield(PubChemClient.search_by_cid(cid)),
+            ANSWER_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        result = None
+    if result:
+        await add_favorite(user_id, cid, result['Name'])
+        await query.answer(f"Сохранено: {result['Name']}")
+    else:
+        await query.answer("Не удалось сохранить молекулу.")
+
+async def remove_from_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Удаляет молекулу из избранного"""
+    query = update.callback_query
+    cid = query.data.replace("remove_", "")
+    user_id = query.from_user.id
+    name = await remove_favorite(user_id, cid)
+    if name is None:
+        await query.answer()
+        return
+    await query.answer(f"Удалено: {name}")
+    await show_favorites(update, context)
+
+# Нажатия одного пользователя чаще, чем раз в CLICK_COOLDOWN секунд, игнорируются
+CLICK_COOLDOWN = 0.25
+LAST_CLICK = {}
+
+async def debounce_clicks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отбрасывает слишком частые нажатия, чтобы не упираться в лимиты Telegram и PubChem"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    now = time.monotonic()
+    if now - LAST_CLICK.get(user_id, 0) < CLICK_COOLDOWN:
+        await query.answer()
+        raise ApplicationHandlerStop
+    LAST_CLICK[user_id] = now
+
+async def prune_clicks(interval=60):
+    """Периодически удаляет устаревшие записи о нажатиях"""
+    while True:
+        await asyncio.sleep(interval)
+        cutoff = time.monotonic() - interval
+        for user_id in [uid for uid, ts in LAST_CLICK.items() if ts < cutoff]:
+            del LAST_CLICK[user_id]
+
+# Обработчики кнопок: шаблон callback_data -> функция
+CALLBACK_HANDLERS = [
+    (r'^back_to_menu$', answer_first(back_to_menu)),
+    (r'^search$', answer_first(search_command)),
+    (r'^random$', answer_first(random_molecule)),
+    (r'^compare$', answer_first(compare_command)),
+    (r'^examples$', answer_first(show_examples)),
+    (r'^history$', answer_first(show_history)),
+    (r'^favorites$', answer_first(show_favorites)),
+    (r'^help$', answer_first(help_command)),
+    (r'^category_', answer_first(show_category)),
+    (r'^search_', answer_first(search_example)),
+    (r'^history_', answer_first(open_history_item)),
+    (r'^similar_', answer_first(show_similar)),
+    (r'^save_', save_to_favorites),
+    (r'^remove_', remove_from_favorites),
+]
+
+async def on_startup(application: Application):
+    """Открывает базу данных и запускает фоновые задачи"""
+    await open_db(application)
+    application.bot_data['prune_clicks'] = asyncio.create_task(prune_clicks())
+
+async def on_shutdown(application: Application):
+    """Останавливает фоновые задачи и закрывает соединения с PubChem, Redis и базой данных"""
+    application.bot_data['prune_clicks'].cancel()
+    await PUBCHEM.aclose()
+    if DB is not None:
+        await DB.close()
+    if REDIS is not None:
+        await REDIS.aclose()
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Обрабатывает обновления разных чатов параллельно, а одного чата — строго по очереди.
     
-    # Обработчики команд
-    application.add_handler(CommandHandler("start", start))
+    ConversationHandler не рассчитан на параллельную обработку сообщений одного
+    пользователя: два сообщения подряд попали бы в одно и то же состояние диалога.
     
-    # Обработчики диалогов
-    search_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(search_command, pattern='^search$')],
-        states={
-            SEARCH: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_search)]
-        },
-        fallbacks=[CallbackQueryHandler(show_main_menu, pattern='^back_to_menu$')]
-    )
+    Обновления каждого чата складываются в свою очередь, которую разбирает отдельная
+    задача. Слот из общего лимита занимает только выполняемое обновление, поэтому
+    очередь одного занятого чата не задерживает остальных пользователей.
+    """
     
-    compare_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(compare_command, pattern='^compare$')],
-        states={
-            COMPARE_FIRST: [MessageHandler(filters.TEXT & ~filters.COMMAND, compare_first)],
-            COMPARE_SECOND: [MessageHandler(filters.TEXT & ~filters.COMMAND, compare_second)]
-        },
-        fallbacks=[CallbackQueryHandler(show_main_menu, pattern='^back_to_menu$')]
-    )
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self.running = asyncio.Semaphore(max_concurrent_updates)
+        self.queues = {}  # chat_id -> очередь ожидающих обновлений
+        self.workers = set()
     
-    application.add_handler(search_conv)
-    application.add_handler(compare_conv)
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self.running:
+                await coroutine
+            return
+        
+        queue = self.queues.get(chat.id)
+        if queue is not None:
+            queue.append(coroutine)
+            return
+        
+        self.queues[chat.id] = deque([coroutine])
+        worker = asyncio.create_task(self.drain(chat.id))
+        self.workers.add(worker)
+        worker.add_done_callback(self.workers.discard)
     
-    # Обработчик обычных сообщений
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    async def drain(self, chat_id):
+        """Выполняет обновления чата по одному, пока очередь не опустеет"""
+        queue = self.queues[chat_id]
+        try:
+            while queue:
+                coroutine = queue.popleft()
+                async with self.running:
+                    try:
+                        await coroutine
+                    except Exception as e:
+                        logger.error(f"Error processing update: {e}")
+        finally:
+            del self.queues[chat_id]
     
-    # Обработчик кнопок
-    application.add_handler(CallbackQueryHandler(button_handler))
+    async def initialize(self):
+        pass
     
-    application.run_polling()
+    async def shutdown(self):
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+APPLICATION = (
+    Application.builder()
+    .token(BOT_TOKEN)
+    .concurrent_updates(PerChatUpdateProcessor(256))
+    .post_init(on_startup)
+    .post_shutdown(on_shutdown)
+    .build()
+)
+
+# Защита от слишком частых нажатий — срабатывает раньше остальных обработчиков
+APPLICATION.add_handler(CallbackQueryHandler(debounce_clicks), group=-1)
+
+# Обработчики команд
+APPLICATION.add_handler(CommandHandler("start", start))
+
+# Обработчики диалогов
+search_conv = ConversationHandler(
+    entry_points=[CallbackQueryHandler(answer_first(search_command), pattern='^search$')],
+    states={
+        SEARCH: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_search)]
+    },
+    fallbacks=[CallbackQueryHandler(answer_first(back_to_menu), pattern='^back_to_menu$')]
+)
+
+compare_conv = ConversationHandler(
+    entry_points=[CallbackQueryHandler(answer_first(compare_command), pattern='^compare$')],
+    states={
+        COMPARE_FIRST: [MessageHandler(filters.TEXT & ~filters.COMMAND, compare_first)],
+        COMPARE_SECOND: [MessageHandler(filters.TEXT & ~filters.COMMAND, compare_second)]
+    },
+    fallbacks=[CallbackQueryHandler(answer_first(back_to_menu), pattern='^back_to_menu$')]
+)
+
+APPLICATION.add_handler(search_conv)
+APPLICATION.add_handler(compare_conv)
+
+# Обработчик обычных сообщений
+APPLICATION.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+
+# Обработчики кнопок
+for pattern, callback in CALLBACK_HANDLERS:
+    APPLICATION.add_handler(CallbackQueryHandler(callback, pattern=pattern))
+
+def main():
+    """Запускает бота"""
+    if uvloop is not None:
+        uvloop.install()
+    APPLICATION.run_polling(drop_pending_updates=True)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123:test")
+
+from telegram import Chat, Message, Update  # noqa: E402
+
+from main import PerChatUpdateProcessor  # noqa: E402
+
+
+def make_update(update_id, chat_id):
+    message = Message(update_id, None, Chat(chat_id, Chat.PRIVATE), text="test")
+    return Update(update_id, message=message)
+
+
+async def record(log, name, delay=0.0):
+    log.append((name, "start", time.monotonic()))
+    await asyncio.sleep(delay)
+    log.append((name, "end", time.monotonic()))
+
+
+def run_updates(processor, updates):
+    async def scenario():
+        async with processor:
+            for update, coroutine in updates:
+                await processor.process_update(update, coroutine)
+    asyncio.run(scenario())
+
+
+def test_updates_of_one_chat_run_in_order():
+    log = []
+    processor = PerChatUpdateProcessor(4)
+    run_updates(processor, [
+        (make_update(1, 1), record(log, "first", 0.05)),
+        (make_update(2, 1), record(log, "second")),
+    ])
+    assert [(name, event) for name, event, _ in log] == [
+        ("first", "start"), ("first", "end"),
+        ("second", "start"), ("second", "end"),
+    ]
+    assert processor.queues == {}
+
+
+def test_busy_chat_does_not_block_other_chats():
+    log = []
+    processor = PerChatUpdateProcessor(4)
+    started = time.monotonic()
+    busy_chat = [(make_update(1, 1), record(log, "slow", 0.5))]
+    busy_chat += [(make_update(i, 1), record(log, f"queued{i}")) for i in range(2, 6)]
+    run_updates(processor, busy_chat + [(make_update(10, 2), record(log, "other"))])
+
+    other_start = next(ts for name, event, ts in log if name == "other" and event == "start")
+    assert other_start - started < 0.2